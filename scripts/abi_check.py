@@ -98,7 +98,9 @@ function name and parameter list.
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import functools
 import glob
+import hashlib
 import os
 import re
 import sys
@@ -108,7 +110,9 @@ import subprocess
 import argparse
 import logging
 import tempfile
-import fnmatch
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from types import SimpleNamespace
 
 import xml.etree.ElementTree as ET
@@ -116,8 +120,47 @@ import xml.etree.ElementTree as ET
 from mbedtls_dev import build_tree
 
 
+class RepoVersion:
+    """Details of one of the two versions being compared."""
+    # pylint: disable=too-few-public-methods
+    # The set of attributes is fixed, so there is no need for a
+    # per-instance dictionary.
+    __slots__ = ['version', 'repository', 'revision', 'commit',
+                 'crypto_repository', 'crypto_revision',
+                 'abi_dumps', 'storage_tests', 'modules', 'module_hashes']
+
+    def __init__(self, version, repository, revision,
+                 crypto_repository, crypto_revision):
+        """Describe a version to check out.
+
+        version: "old" or "new"
+        repository: repository to fetch revision from, or None for the
+            current repository
+        revision: git revision to check out
+        crypto_repository, crypto_revision: the same for the crypto
+            submodule, if any
+        """
+        self.version = version
+        self.repository = repository
+        self.revision = revision
+        self.commit = None
+        self.crypto_repository = crypto_repository
+        self.crypto_revision = crypto_revision
+        self.abi_dumps = {}
+        self.storage_tests = {}
+        self.modules = {}
+        self.module_hashes = {}
+
+
+# Where a storage format test case was found. There is one of these for
+# each storage test case, so use a tuple type rather than a full object.
+StorageTestMetadata = namedtuple('StorageTestMetadata',
+                                 ['filename', 'line_number', 'description'])
+
+
 class AbiChecker:
     """API and ABI checker."""
+    # pylint: disable=too-many-instance-attributes
 
     def __init__(self, old_version, new_version, configuration):
         """Instantiate the API/ABI checker.
@@ -131,6 +174,10 @@ class AbiChecker:
         configuration.check_api: if true, compare APIs
         configuration.check_storage: if true, compare storage format tests
         configuration.skip_file: path to file containing symbols and types to skip
+        configuration.abi_dump_cache: if not None, directory where ABI dumps
+            are cached across runs, keyed by the contents of each library
+        configuration.persistent_worktrees: if true, keep the worktrees
+            and reuse them in the next run
         """
         self.repo_path = "."
         self.log = None
@@ -143,6 +190,10 @@ class AbiChecker:
         self.old_version = old_version
         self.new_version = new_version
         self.skip_file = configuration.skip_file
+        self.abi_dump_cache = configuration.abi_dump_cache
+        # Set in check_for_abi_changes if there is an ABI dump cache.
+        self.abi_dumper_version = None
+        self.persistent_worktrees = configuration.persistent_worktrees
         self.check_abi = configuration.check_abi
         self.check_api = configuration.check_api
         if self.check_abi != self.check_api:
@@ -151,6 +202,13 @@ class AbiChecker:
         self.brief = configuration.brief
         self.git_command = "git"
         self.make_command = "make"
+        # The old and new versions are processed in parallel. Git commands
+        # that modify the main repository (fetch, worktree administration)
+        # must not run concurrently, so they are serialized with this lock.
+        self.git_lock = threading.Lock()
+        # Storage tests parsed from each .data file, indexed by the file's
+        # name and hash (see _read_storage_tests).
+        self.parsed_storage_tests = {}
 
     def _setup_logger(self):
         self.log = logging.getLogger()
@@ -166,96 +224,262 @@ class AbiChecker:
             if not shutil.which(command):
                 raise Exception("{} not installed, aborting".format(command))
 
-    def _get_clean_worktree_for_git_revision(self, version):
-        """Make a separate worktree with version.revision checked out.
-        Do not modify the current worktree."""
-        git_worktree_path = tempfile.mkdtemp()
-        if version.repository:
-            self.log.debug(
-                "Checking out git worktree for revision {} from {}".format(
-                    version.revision, version.repository
-                )
-            )
-            fetch_output = subprocess.check_output(
-                [self.git_command, "fetch",
-                 version.repository, version.revision],
-                cwd=self.repo_path,
-                stderr=subprocess.STDOUT
-            )
-            self.log.debug(fetch_output.decode("utf-8"))
-            worktree_rev = "FETCH_HEAD"
+    def _run_command(self, version, command, cwd=None, env=None):
+        """Run command, whose output is only of interest for debugging.
+
+        In verbose mode, log the output line by line as it is produced, so
+        that a long output (e.g. from make) is never held in memory, and so
+        that the output of a failed command is still logged. The old and
+        new versions are processed in parallel, so each line is prefixed
+        with the name of the version it is about. Otherwise discard the
+        output.
+        """
+        if self.verbose:
+            with subprocess.Popen(
+                    command,
+                    cwd=cwd,
+                    env=env,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
+                    bufsize=1,
+                    encoding="utf-8",
+                    errors="replace"
+            ) as process:
+                for line in process.stdout:
+                    self.log.debug("[{}] {}".format(version.version,
+                                                    line.rstrip("\n")))
+            if process.returncode != 0:
+                raise subprocess.CalledProcessError(process.returncode,
+                                                    command)
         else:
-            self.log.debug("Checking out git worktree for revision {}".format(
-                version.revision
-            ))
-            worktree_rev = version.revision
-        worktree_output = subprocess.check_output(
-            [self.git_command, "worktree", "add", "--detach",
-             git_worktree_path, worktree_rev],
+            subprocess.check_call(
+                command,
+                cwd=cwd,
+                env=env,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL
+            )
+
+    def _persistent_worktree_path(self, version):
+        """The location of the reusable worktree for the specified version."""
+        git_common_dir = subprocess.check_output(
+            [self.git_command, "rev-parse", "--git-common-dir"],
             cwd=self.repo_path,
             stderr=subprocess.STDOUT
-        )
-        self.log.debug(worktree_output.decode("utf-8"))
-        version.commit = subprocess.check_output(
-            [self.git_command, "rev-parse", "HEAD"],
-            cwd=git_worktree_path,
-            stderr=subprocess.STDOUT
-        ).decode("ascii").rstrip()
+        ).decode("utf-8").rstrip()
+        return os.path.abspath(os.path.join(
+            self.repo_path, git_common_dir,
+            "mbedtls-abi-worktrees", version.version
+        ))
+
+    @staticmethod
+    def _worktree_git_dir(git_worktree_path):
+        """The administrative directory of a linked worktree.
+
+        This is the directory that the worktree's .git file points to,
+        under .git/worktrees in the main repository.
+        """
+        with open(os.path.join(git_worktree_path, ".git")) as git_file:
+            git_dir = git_file.read().strip()
+        if not git_dir.startswith("gitdir: "):
+            raise Exception("{} is not a linked worktree".format(
+                git_worktree_path
+            ))
+        # The path is relative to the worktree if the repository uses
+        # worktree.useRelativePaths. Normalize it so that it stays valid
+        # once the worktree is removed.
+        return os.path.normpath(os.path.join(git_worktree_path,
+                                             git_dir[len("gitdir: "):]))
+
+    def _read_worktree_head(self, git_worktree_path):
+        """Return the commit checked out in a worktree.
+
+        The worktree has a detached HEAD, so its HEAD file contains the
+        commit. Reading it directly saves running git rev-parse.
+        """
+        head_path = os.path.join(self._worktree_git_dir(git_worktree_path),
+                                 "HEAD")
+        with open(head_path) as head_file:
+            head = head_file.read().strip()
+        if head.startswith("ref:"):
+            # Not detached after all: let git resolve the reference.
+            head = subprocess.check_output(
+                [self.git_command, "rev-parse", "HEAD"],
+                cwd=git_worktree_path,
+                stderr=subprocess.STDOUT
+            ).decode("ascii").rstrip()
+        return head
+
+    def _get_clean_worktree_for_git_revision(self, version):
+        """Make a separate worktree with version.revision checked out.
+        Do not modify the current worktree.
+
+        If self.persistent_worktrees is true, reuse the worktree from a
+        previous run if there is one: check out the revision and remove
+        all untracked files, so that the result is equivalent to a new
+        worktree, but files that have not changed keep their timestamps.
+
+        This may run concurrently for the old and new versions. The fetch
+        and the worktree creation are done under self.git_lock, since a
+        concurrent fetch would overwrite FETCH_HEAD."""
+        if self.persistent_worktrees:
+            git_worktree_path = self._persistent_worktree_path(version)
+            reuse_worktree = os.path.exists(git_worktree_path)
+        else:
+            git_worktree_path = tempfile.mkdtemp()
+            reuse_worktree = False
+        with self.git_lock:
+            if version.repository:
+                self.log.debug(
+                    "Checking out git worktree for revision {} from {}".format(
+                        version.revision, version.repository
+                    )
+                )
+                self._run_command(
+                    version,
+                    [self.git_command, "fetch",
+                     version.repository, version.revision],
+                    cwd=self.repo_path
+                )
+                worktree_rev = "FETCH_HEAD"
+            else:
+                self.log.debug("Checking out git worktree for revision {}".format(
+                    version.revision
+                ))
+                worktree_rev = version.revision
+            if reuse_worktree:
+                # FETCH_HEAD is per-repository, so resolve it while
+                # holding the lock.
+                worktree_rev = subprocess.check_output(
+                    [self.git_command, "rev-parse", worktree_rev],
+                    cwd=self.repo_path,
+                    stderr=subprocess.STDOUT
+                ).decode("ascii").rstrip()
+            else:
+                self._run_command(
+                    version,
+                    [self.git_command, "worktree", "add", "--detach",
+                     git_worktree_path, worktree_rev],
+                    cwd=self.repo_path
+                )
+        if reuse_worktree:
+            for command in [["checkout", "--force", "--detach", worktree_rev],
+                            ["clean", "-d", "-f", "-f", "-x"]]:
+                self._run_command(
+                    version,
+                    [self.git_command] + command,
+                    cwd=git_worktree_path
+                )
+        version.commit = self._read_worktree_head(git_worktree_path)
         self.log.debug("Commit is {}".format(version.commit))
         return git_worktree_path
 
     def _update_git_submodules(self, git_worktree_path, version):
         """If the crypto submodule is present, initialize it.
         if version.crypto_revision exists, update it to that revision,
-        otherwise update it to the default revision"""
-        update_output = subprocess.check_output(
-            [self.git_command, "submodule", "update", "--init", '--recursive'],
-            cwd=git_worktree_path,
-            stderr=subprocess.STDOUT
-        )
-        self.log.debug(update_output.decode("utf-8"))
+        otherwise update it to the default revision
+
+        With persistent worktrees, the submodules may contain modified or
+        untracked files (including build products) from a previous run.
+        Discard them, as is done for the top-level worktree."""
+        update_command = [self.git_command, "submodule", "update",
+                          "--init", '--recursive']
+        if self.persistent_worktrees:
+            update_command.append("--force")
+        self._run_command(version, update_command, cwd=git_worktree_path)
+        if self.persistent_worktrees:
+            self._run_command(
+                version,
+                [self.git_command, "submodule", "foreach", "--recursive",
+                 "git clean -d -f -f -x"],
+                cwd=git_worktree_path
+            )
         if not (os.path.exists(os.path.join(git_worktree_path, "crypto"))
                 and version.crypto_revision):
             return
 
         if version.crypto_repository:
-            fetch_output = subprocess.check_output(
+            self._run_command(
+                version,
                 [self.git_command, "fetch", version.crypto_repository,
                  version.crypto_revision],
-                cwd=os.path.join(git_worktree_path, "crypto"),
-                stderr=subprocess.STDOUT
+                cwd=os.path.join(git_worktree_path, "crypto")
             )
-            self.log.debug(fetch_output.decode("utf-8"))
             crypto_rev = "FETCH_HEAD"
         else:
             crypto_rev = version.crypto_revision
 
-        checkout_output = subprocess.check_output(
-            [self.git_command, "checkout", crypto_rev],
-            cwd=os.path.join(git_worktree_path, "crypto"),
-            stderr=subprocess.STDOUT
+        checkout_command = [self.git_command, "checkout", crypto_rev]
+        if self.persistent_worktrees:
+            checkout_command.insert(2, "--force")
+        self._run_command(
+            version,
+            checkout_command,
+            cwd=os.path.join(git_worktree_path, "crypto")
         )
-        self.log.debug(checkout_output.decode("utf-8"))
+
+    @staticmethod
+    def _find_shared_libraries(root):
+        """Yield the paths of the *.so files under root.
+
+        Like os.walk, do not descend into symbolic links to directories.
+        """
+        directories = [root]
+        while directories:
+            with os.scandir(directories.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        if not entry.is_symlink():
+                            directories.append(entry.path)
+                    elif entry.name.endswith(".so"):
+                        yield entry.path
+
+    # Paths that can be used unquoted in a shell command.
+    _SHELL_SAFE_PATH_RE = re.compile(r'[-+,./0-9:=@A-Z_a-z]+\Z')
 
     def _build_shared_libraries(self, git_worktree_path, version):
         """Build the shared libraries in the specified worktree."""
         my_environment = os.environ.copy()
-        my_environment["CFLAGS"] = "-g -Og"
+        # abi-dumper only needs the debug information, and the exported
+        # symbols and types do not depend on the optimization level, so
+        # don't spend time optimizing.
+        my_environment["CFLAGS"] = "-g -O0"
+        # Don't record the worktree location in the debug information, so
+        # that identical sources produce identical libraries in the old and
+        # new worktrees. make passes CFLAGS to the shell unquoted, so only
+        # do this if the path contains no whitespace or shell
+        # metacharacters. Otherwise the libraries always differ and are
+        # always compared by abi-compliance-checker.
+        if self._SHELL_SAFE_PATH_RE.match(git_worktree_path):
+            my_environment["CFLAGS"] += " -fdebug-prefix-map={}=.".format(
+                git_worktree_path
+            )
+        # Like all.sh, build in parallel unless the caller set MAKEFLAGS.
+        # The old and new versions are built at the same time, so each
+        # build gets half of the CPUs.
+        if "MAKEFLAGS" not in my_environment:
+            my_environment["MAKEFLAGS"] = "-j{}".format(
+                max(1, (os.cpu_count() or 1) // 2)
+            )
         my_environment["SHARED"] = "1"
         if os.path.exists(os.path.join(git_worktree_path, "crypto")):
             my_environment["USE_CRYPTO_SUBMODULE"] = "1"
-        make_output = subprocess.check_output(
+        if shutil.which("ccache") and "ccache" not in my_environment.get("CC", ""):
+            # With ccache, rebuilding files that are identical to a
+            # previous build (in the other version, or in a previous run
+            # with persistent worktrees) is almost free.
+            my_environment["CC"] = "ccache " + my_environment.get("CC", "cc")
+            my_environment["CCACHE_BASEDIR"] = git_worktree_path
+        self._run_command(
+            version,
             [self.make_command, "lib"],
             env=my_environment,
-            cwd=git_worktree_path,
-            stderr=subprocess.STDOUT
+            cwd=git_worktree_path
         )
-        self.log.debug(make_output.decode("utf-8"))
-        for root, _dirs, files in os.walk(git_worktree_path):
-            for file in fnmatch.filter(files, "*.so"):
-                version.modules[os.path.splitext(file)[0]] = (
-                    os.path.join(root, file)
-                )
+        for library_path in self._find_shared_libraries(git_worktree_path):
+            version.modules[
+                os.path.splitext(os.path.basename(library_path))[0]
+            ] = library_path
 
     @staticmethod
     def _pretty_revision(version):
@@ -264,34 +488,154 @@ class AbiChecker:
         else:
             return "{} ({})".format(version.revision, version.commit)
 
+    @staticmethod
+    def _file_sha256(path):
+        """Return the SHA-256 hash of the content of the file at path."""
+        file_hash = hashlib.sha256()
+        with open(path, 'rb') as fd:
+            for chunk in iter(lambda: fd.read(1 << 20), b''):
+                file_hash.update(chunk)
+        return file_hash.hexdigest()
+
+    def _abi_dump_cache_path(self, library_hash, lver):
+        """Return the path of the cached ABI dump for the given library.
+
+        The dump depends only on the library file, on the version label and
+        on the version of abi-dumper (whose dump format can change), so the
+        cache key is a hash of all three.
+        """
+        key = hashlib.sha256()
+        key.update(library_hash.encode('ascii'))
+        key.update(b'\0' + lver.encode('utf-8'))
+        key.update(b'\0' + self.abi_dumper_version.encode('utf-8'))
+        return os.path.join(self.abi_dump_cache, key.hexdigest() + '.dump')
+
+    def _run_abi_dumper(self, version, module_path, library_hash, output_path):
+        """Dump the ABI of the library module_path of version to output_path.
+
+        If a dump cache is configured, reuse a previous dump of an identical
+        library if there is one, and otherwise save the new dump in the cache.
+        """
+        lver = self._pretty_revision(version)
+        cache_path = None
+        if self.abi_dump_cache:
+            cache_path = self._abi_dump_cache_path(library_hash, lver)
+            if os.path.exists(cache_path):
+                self.log.debug("Reusing cached ABI dump {} for {}".format(
+                    cache_path, module_path
+                ))
+                # abi-dumper creates the report directory, but it doesn't
+                # run on a cache hit.
+                os.makedirs(self.report_dir, exist_ok=True)
+                shutil.copyfile(cache_path, output_path)
+                return
+        abi_dump_command = [
+            "abi-dumper",
+            module_path,
+            "-o", output_path,
+            "-lver", lver,
+        ]
+        # Don't let elfutils try to download debug information: everything
+        # abi-dumper needs is in the library that we just built.
+        my_environment = os.environ.copy()
+        my_environment["DEBUGINFOD_URLS"] = ""
+        self._run_command(
+            version,
+            abi_dump_command,
+            env=my_environment
+        )
+        if cache_path:
+            os.makedirs(self.abi_dump_cache, exist_ok=True)
+            # Copy then rename, so that a concurrent writer never sees a
+            # partially written cache entry.
+            temp_fd, temp_path = tempfile.mkstemp(dir=self.abi_dump_cache)
+            os.close(temp_fd)
+            shutil.copyfile(output_path, temp_path)
+            os.replace(temp_path, cache_path)
+
     def _get_abi_dumps_from_shared_libraries(self, version):
         """Generate the ABI dumps for the specified git revision.
         The shared libraries must have been built and the module paths
-        present in version.modules."""
+        present in version.modules.
+
+        Also record the hash of each library in version.module_hashes.
+
+        The libraries are independent, so abi-dumper runs on all of them
+        in parallel."""
         for mbed_module, module_path in version.modules.items():
-            output_path = os.path.join(
+            version.module_hashes[mbed_module] = self._file_sha256(module_path)
+            version.abi_dumps[mbed_module] = os.path.join(
                 self.report_dir, "{}-{}-{}.dump".format(
                     mbed_module, version.revision, version.version
                 )
             )
-            abi_dump_command = [
-                "abi-dumper",
-                module_path,
-                "-o", output_path,
-                "-lver", self._pretty_revision(version),
-            ]
-            abi_dump_output = subprocess.check_output(
-                abi_dump_command,
-                stderr=subprocess.STDOUT
-            )
-            self.log.debug(abi_dump_output.decode("utf-8"))
-            version.abi_dumps[mbed_module] = output_path
+        with ThreadPoolExecutor(
+                max_workers=max(1, len(version.modules))) as executor:
+            # Consume the results to propagate any exception.
+            list(executor.map(
+                functools.partial(self._run_abi_dumper, version),
+                version.modules.values(),
+                version.module_hashes.values(),
+                version.abi_dumps.values()
+            ))
+
+    # Translation table that deletes all ASCII whitespace.
+    _WHITESPACE_TABLE = str.maketrans('', '', ' \t\n\r\v\f')
 
     @staticmethod
     def _normalize_storage_test_case_data(line):
         """Eliminate cosmetic or irrelevant details in storage format test cases."""
-        line = re.sub(r'\s+', r'', line)
-        return line
+        return line.translate(AbiChecker._WHITESPACE_TABLE)
+
+    # A paragraph of a .data file: optional comment lines, then the
+    # description line (group 1), then the remaining non-blank lines of the
+    # paragraph (group 2). Matching whole paragraphs keeps the scan of
+    # comments and blank lines inside the regex engine. This works on the
+    # raw bytes, so that only the parts that are recorded get decoded.
+    _DATA_PARAGRAPH_RE = re.compile(rb'(?:^[^\S\n]*#[^\n]*(?:\n|\Z))*'
+                                    rb'^[^\S\n]*([^#\s][^\n]*)(?:\n|\Z)'
+                                    rb'((?:^[^\S\n]*\S[^\n]*(?:\n|\Z))*)',
+                                    re.M)
+
+    def _parse_storage_tests(self, content, filename, is_generated):
+        """Parse the storage tests from content, the bytes of a .data file.
+
+        Return a dictionary mapping each test case to its metadata.
+        """
+        storage_tests = {}
+        # Line number at position `counted_up_to` in content, updated
+        # incrementally so that the file is only scanned once in total.
+        line_number = 1
+        counted_up_to = 0
+        for paragraph in self._DATA_PARAGRAPH_RE.finditer(content):
+            description = paragraph.group(1).strip().decode('utf-8')
+            line_number += content.count(b'\n', counted_up_to,
+                                         paragraph.start(2))
+            counted_up_to = paragraph.start(2)
+            for offset, line in enumerate(paragraph.group(2).split(b'\n')):
+                line = line.strip()
+                if not line or line.startswith(b'#') or \
+                   line.startswith(b'depends_on:'):
+                    continue
+                # We've reached a test case data line
+                test_case_data = self._normalize_storage_test_case_data(
+                    line.decode('utf-8')
+                )
+                if not is_generated:
+                    # In manual test data, only look at read tests.
+                    function_name = test_case_data.split(':', 1)[0]
+                    if 'read' not in function_name.split('_'):
+                        continue
+                # Positional arguments: this is called for every test case,
+                # and keyword arguments make tuple creation slower.
+                metadata = StorageTestMetadata(filename,
+                                               line_number + offset,
+                                               description)
+                # Intern the key: most test cases are present in both
+                # versions, so the two dictionaries share the strings, and
+                # comparing them is usually a pointer comparison.
+                storage_tests[sys.intern(test_case_data)] = metadata
+        return storage_tests
 
     def _read_storage_tests(self,
                             directory,
@@ -302,37 +646,20 @@ class AbiChecker:
 
         Populate the storage_tests dictionary with test cases read from
         filename under directory.
+
+        Most files are identical in the old and new versions, so the
+        parsed content of each file is remembered, indexed by its hash.
         """
-        at_paragraph_start = True
-        description = None
         full_path = os.path.join(directory, filename)
-        with open(full_path) as fd:
-            for line_number, line in enumerate(fd, 1):
-                line = line.strip()
-                if not line:
-                    at_paragraph_start = True
-                    continue
-                if line.startswith('#'):
-                    continue
-                if at_paragraph_start:
-                    description = line.strip()
-                    at_paragraph_start = False
-                    continue
-                if line.startswith('depends_on:'):
-                    continue
-                # We've reached a test case data line
-                test_case_data = self._normalize_storage_test_case_data(line)
-                if not is_generated:
-                    # In manual test data, only look at read tests.
-                    function_name = test_case_data.split(':', 1)[0]
-                    if 'read' not in function_name.split('_'):
-                        continue
-                metadata = SimpleNamespace(
-                    filename=filename,
-                    line_number=line_number,
-                    description=description
-                )
-                storage_tests[test_case_data] = metadata
+        with open(full_path, 'rb') as fd:
+            content = fd.read()
+        key = (filename, is_generated, hashlib.sha1(content).digest())
+        file_tests = self.parsed_storage_tests.get(key)
+        if file_tests is None:
+            file_tests = self._parse_storage_tests(content,
+                                                   filename, is_generated)
+            self.parsed_storage_tests[key] = file_tests
+        storage_tests.update(file_tests)
 
     @staticmethod
     def _list_generated_test_data_files(git_worktree_path):
@@ -375,14 +702,14 @@ class AbiChecker:
                                      version.storage_tests)
 
     def _cleanup_worktree(self, git_worktree_path):
-        """Remove the specified git worktree."""
+        """Remove the specified git worktree, unless it is to be reused."""
+        if self.persistent_worktrees:
+            return
+        # Remove the worktree's administrative files directly, rather than
+        # running git worktree prune, which would have to check all the
+        # repository's worktrees.
+        shutil.rmtree(self._worktree_git_dir(git_worktree_path))
         shutil.rmtree(git_worktree_path)
-        worktree_output = subprocess.check_output(
-            [self.git_command, "worktree", "prune"],
-            cwd=self.repo_path,
-            stderr=subprocess.STDOUT
-        )
-        self.log.debug(worktree_output.decode("utf-8"))
 
     def _get_abi_dump_for_ref(self, version):
         """Generate the interface information for the specified git revision."""
@@ -395,22 +722,27 @@ class AbiChecker:
             self._get_storage_format_tests(version, git_worktree_path)
         self._cleanup_worktree(git_worktree_path)
 
-    def _remove_children_with_tag(self, parent, tag):
-        children = parent.getchildren()
-        for child in children:
-            if child.tag == tag:
-                parent.remove(child)
-            else:
-                self._remove_children_with_tag(child, tag)
+    @staticmethod
+    def _remove_descendants_with_tags(root, tags):
+        """Remove all the elements under root whose tag is in tags."""
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            for child in list(node):
+                if child.tag in tags:
+                    node.remove(child)
+                else:
+                    stack.append(child)
 
     def _remove_extra_detail_from_report(self, report_root):
-        for tag in ['test_info', 'test_results', 'problem_summary',
-                    'added_symbols', 'affected']:
-            self._remove_children_with_tag(report_root, tag)
+        self._remove_descendants_with_tags(report_root, frozenset([
+            'test_info', 'test_results', 'problem_summary',
+            'added_symbols', 'affected'
+        ]))
 
         for report in report_root:
-            for problems in report.getchildren()[:]:
-                if not problems.getchildren():
+            for problems in list(report):
+                if len(problems) == 0:
                     report.remove(problems)
 
     def _abi_compliance_command(self, mbed_module, output_path):
@@ -441,6 +773,17 @@ class AbiChecker:
                 self.new_version.revision
             )
         )
+        if not self.keep_all_reports and \
+           self.old_version.module_hashes[mbed_module] == \
+           self.new_version.module_hashes[mbed_module]:
+            # Identical libraries are trivially compatible, so there is
+            # no need to run abi-compliance-checker.
+            compatibility_report.append(
+                "No compatibility issues for {} (identical library)".format(
+                    mbed_module
+                )
+            )
+            return True
         try:
             subprocess.check_output(
                 self._abi_compliance_command(mbed_module, output_path),
@@ -450,12 +793,16 @@ class AbiChecker:
             if err.returncode != 1:
                 raise err
             if self.brief:
-                self.log.info(
+                # This runs in parallel for all the libraries, so don't log
+                # directly: the caller outputs the reports in order.
+                compatibility_report.append(
                     "Compatibility issues found for {}".format(mbed_module)
                 )
                 report_root = ET.fromstring(err.output.decode("utf-8"))
                 self._remove_extra_detail_from_report(report_root)
-                self.log.info(ET.tostring(report_root).decode("utf-8"))
+                compatibility_report.append(
+                    ET.tostring(report_root).decode("utf-8")
+                )
             else:
                 self.can_remove_report_dir = False
                 compatibility_report.append(
@@ -477,13 +824,12 @@ class AbiChecker:
 
         Append a message regarding compatibility to compatibility_report.
         """
-        missing = frozenset(old_tests.keys()).difference(new_tests.keys())
+        missing = old_tests.keys() - new_tests.keys()
         for test_data in sorted(missing):
-            metadata = old_tests[test_data]
+            filename, line_number, description = old_tests[test_data]
             compatibility_report.append(
                 'Test case from {} line {} "{}" has disappeared: {}'.format(
-                    metadata.filename, metadata.line_number,
-                    metadata.description, test_data
+                    filename, line_number, description, test_data
                 )
             )
         compatibility_report.append(
@@ -512,12 +858,21 @@ class AbiChecker:
         compliance_return_code = 0
 
         if self.check_abi:
-            shared_modules = list(set(self.old_version.modules.keys()) &
-                                  set(self.new_version.modules.keys()))
-            for mbed_module in shared_modules:
-                if not self._is_library_compatible(mbed_module,
-                                                   compatibility_report):
-                    compliance_return_code = 1
+            shared_modules = sorted(set(self.old_version.modules.keys()) &
+                                    set(self.new_version.modules.keys()))
+            # Check the libraries in parallel. Each check gets its own
+            # report list so that the output order stays deterministic.
+            module_reports = [[] for _ in shared_modules]
+            with ThreadPoolExecutor(
+                    max_workers=max(1, len(shared_modules))) as executor:
+                module_results = list(executor.map(
+                    self._is_library_compatible,
+                    shared_modules, module_reports
+                ))
+            for module_report in module_reports:
+                compatibility_report += module_report
+            if not all(module_results):
+                compliance_return_code = 1
 
         if self.check_storage_tests:
             if not self._is_storage_format_compatible(
@@ -527,21 +882,56 @@ class AbiChecker:
                 compliance_return_code = 1
 
         for version in [self.old_version, self.new_version]:
-            for mbed_module, mbed_module_dump in version.abi_dumps.items():
+            for mbed_module_dump in version.abi_dumps.values():
                 os.remove(mbed_module_dump)
         if self.can_remove_report_dir:
             os.rmdir(self.report_dir)
         self.log.info("\n".join(compatibility_report))
         return compliance_return_code
 
+    def _versions_are_identical(self):
+        """Check whether the old and new versions are the same commit.
+
+        This is only determined for revisions in the local repository
+        without a crypto submodule override. In other cases, return False.
+        """
+        for version in [self.old_version, self.new_version]:
+            if version.repository or version.crypto_revision:
+                return False
+        commits = subprocess.check_output(
+            [self.git_command, "rev-parse",
+             self.old_version.revision + "^{commit}",
+             self.new_version.revision + "^{commit}"],
+            cwd=self.repo_path,
+            stderr=subprocess.STDOUT
+        ).decode("ascii").split()
+        if commits[0] != commits[1]:
+            return False
+        self.old_version.commit = self.new_version.commit = commits[0]
+        return True
+
     def check_for_abi_changes(self):
         """Generate a report of ABI differences
         between self.old_rev and self.new_rev."""
         build_tree.check_repo_path()
+        if self._versions_are_identical():
+            self.log.info("Same commit {} for {} and {}, skipping ABI check"
+                          .format(self.old_version.commit,
+                                  self.old_version.revision,
+                                  self.new_version.revision))
+            return 0
         if self.check_api or self.check_abi:
             self.check_abi_tools_are_installed()
-        self._get_abi_dump_for_ref(self.old_version)
-        self._get_abi_dump_for_ref(self.new_version)
+            if self.abi_dump_cache:
+                self.abi_dumper_version = subprocess.check_output(
+                    ["abi-dumper", "-dumpversion"],
+                    stderr=subprocess.STDOUT
+                ).decode("utf-8").strip()
+        # Each version is built in its own worktree, so the two versions
+        # can be processed in parallel.
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            list(executor.map(self._get_abi_dump_for_ref,
+                              [self.old_version, self.new_version]))
         return self.get_abi_compatibility_report()
 
 
@@ -620,31 +1010,33 @@ def run_main():
             "-b", "--brief", action="store_true",
             help="output only the list of issues to stdout, instead of a full report",
         )
+        parser.add_argument(
+            "--abi-dump-cache", type=str,
+            help=("directory where ABI dumps are cached across runs "
+                  "(default: no cache)"),
+        )
+        parser.add_argument(
+            "--persistent-worktrees", action="store_true",
+            help=("keep the worktrees of the old and new versions in the git "
+                  "directory and reuse them in subsequent runs"),
+        )
         abi_args = parser.parse_args()
         if os.path.isfile(abi_args.report_dir):
             print("Error: {} is not a directory".format(abi_args.report_dir))
             parser.exit()
-        old_version = SimpleNamespace(
+        old_version = RepoVersion(
             version="old",
             repository=abi_args.old_repo,
             revision=abi_args.old_rev,
-            commit=None,
             crypto_repository=abi_args.old_crypto_repo,
-            crypto_revision=abi_args.old_crypto_rev,
-            abi_dumps={},
-            storage_tests={},
-            modules={}
+            crypto_revision=abi_args.old_crypto_rev
         )
-        new_version = SimpleNamespace(
+        new_version = RepoVersion(
             version="new",
             repository=abi_args.new_repo,
             revision=abi_args.new_rev,
-            commit=None,
             crypto_repository=abi_args.new_crypto_repo,
-            crypto_revision=abi_args.new_crypto_rev,
-            abi_dumps={},
-            storage_tests={},
-            modules={}
+            crypto_revision=abi_args.new_crypto_rev
         )
         configuration = SimpleNamespace(
             verbose=abi_args.verbose,
@@ -654,7 +1046,9 @@ def run_main():
             check_abi=abi_args.check_abi,
             check_api=abi_args.check_api,
             check_storage=abi_args.check_storage,
-            skip_file=abi_args.skip_file
+            skip_file=abi_args.skip_file,
+            abi_dump_cache=abi_args.abi_dump_cache,
+            persistent_worktrees=abi_args.persistent_worktrees
         )
         abi_check = AbiChecker(old_version, new_version, configuration)
         return_code = abi_check.check_for_abi_changes()